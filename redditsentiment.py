@@ -2,15 +2,107 @@ import streamlit as st
 import os
 import praw
 import pandas as pd
+import matplotlib
+# Render the ZIP's PNGs with the non-interactive backend
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 from datetime import datetime
 import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 import zipfile
+import re
 import io
+import itertools
+import multiprocessing
+import threading
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from scoring import (
+    SCORE_COLUMNS, PickledLexiconAnalyzer, init_worker, non_blank_mask, prepare_texts, scorable_mask,
+    score_chunk, unscored_defaults
+)
+
+
+@st.cache_resource
+def get_sid():
+    """Download the VADER lexicon and build the analyzer once per process."""
+    nltk.download('vader_lexicon', quiet=True)
+    return PickledLexiconAnalyzer()
+
+
+# Number of threads used to fetch comment trees concurrently
+N_WORKERS = 8
+# Posts fetched ahead of the consumer, bounding comments held in memory
+MAX_IN_FLIGHT = N_WORKERS * 2
+_thread_local = threading.local()
+
+# Hard cap on comments per scrape, and rows per DataFrame chunk
+MAX_COMMENTS = 50000
+CHUNK_ROWS = 10000
+
+# Below this many comments VADER runs in-process rather than in a process pool
+PARALLEL_MIN_ROWS = 5000
+# Pool workers are forked: spawn and forkserver children would re-run this
+# whole script as __mp_main__. Without fork, VADER always runs in-process.
+CAN_FORK = "fork" in multiprocessing.get_all_start_methods()
+
+
+def fetch_comments(credentials, post_id):
+    """Fetch the bodies and epoch timestamps of all comments on a post.
+
+    Uses a PRAW instance private to the calling thread.
+    """
+    if not hasattr(_thread_local, "reddit"):
+        _thread_local.reddit = praw.Reddit(**credentials)
+    submission = _thread_local.reddit.submission(id=post_id)
+    # Expand all comments (removing MoreComments objects)
+    submission.comments.replace_more(limit=0)
+    comments = submission.comments.list()
+    return [c.body for c in comments], [c.created_utc for c in comments]
+
+
+def scrape(credentials, matching_posts):
+    """Yield (text, title, url, subreddit, timestamp) for every comment on the matching posts.
+
+    matching_posts maps post IDs to (title, url, subreddit) tuples. Comment
+    trees are fetched concurrently, at most MAX_IN_FLIGHT posts ahead of the
+    consumer; closing the generator cancels the fetches that have not
+    started yet and waits for the running ones, so no fetch thread is left
+    behind when the scoring pool forks.
+    """
+    executor = ThreadPoolExecutor(max_workers=N_WORKERS)
+    posts = iter(matching_posts.items())
+    pending = deque()
+    try:
+        for post_id, post in itertools.islice(posts, MAX_IN_FLIGHT):
+            pending.append((post, executor.submit(fetch_comments, credentials, post_id)))
+        while pending:
+            # Drop each future once taken so its comments can be freed after use
+            (title, url, subreddit_name), future = pending.popleft()
+            for post_id, post in itertools.islice(posts, 1):
+                pending.append((post, executor.submit(fetch_comments, credentials, post_id)))
+            try:
+                post_texts, post_timestamps = future.result()
+            except Exception as e:
+                st.write(f"Error processing post '{title}' in subreddit '{subreddit_name}': {e}")
+                continue
+            for text, timestamp in zip(post_texts, post_timestamps):
+                yield text, title, url, subreddit_name, timestamp
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def comments_frame(texts, titles, urls, subs, timestamps):
+    """Build a DataFrame chunk from per-column lists of scraped comments."""
+    return pd.DataFrame({
+        "text": texts,
+        "title": titles,
+        "url": urls,
+        "subreddit": subs,
+        "date": pd.to_datetime(timestamps, unit="s", utc=True)
+    })
 
-# Download the VADER lexicon (comment this out if already downloaded)
-nltk.download('vader_lexicon')
 
 st.title("Reddit Sentiment Analysis")
 
@@ -33,7 +125,10 @@ if st.button("Run Analysis"):
     else:
         # Parse subreddits and keywords into lists
         subreddits = [s.strip() for s in subreddits_input.split(",") if s.strip()]
-        keywords = [k.strip() for k in keywords_input.split(",") if k.strip()]
+        # Quotes would end the search's title:"..." phrase early, so drop them, along
+        # with keywords left empty (an empty phrase would match every title)
+        keywords = [k.replace('"', '').strip() for k in keywords_input.split(",")]
+        keywords = [k for k in keywords if k]
         
         if not subreddits:
             st.error("Please enter at least one subreddit.")
@@ -41,45 +136,70 @@ if st.button("Run Analysis"):
             st.error("Please enter at least one keyword.")
         else:
             # Initialize PRAW
+            credentials = {
+                "client_id": client_id,
+                "client_secret": client_secret,
+                "user_agent": user_agent
+            }
             try:
-                reddit = praw.Reddit(
-                    client_id=client_id,
-                    client_secret=client_secret,
-                    user_agent=user_agent
-                )
+                reddit = praw.Reddit(**credentials)
             except Exception as e:
                 st.error(f"Failed to initialize PRAW:\n{e}")
             else:
                 st.info("Scraping Reddit posts and comments... This may take some time.")
-                all_data = []
+                matching_posts = {}
+                
+                # Search all subreddits at once for posts whose title matches a keyword
+                multi = "+".join(subreddits)
+                query = " OR ".join(f'(title:"{k}")' for k in keywords)
+                keyword_re = re.compile("|".join(re.escape(k) for k in keywords), re.IGNORECASE)
+                try:
+                    # Limit to 500 newest matching posts (adjust as needed)
+                    for post in reddit.subreddit(multi).search(query, syntax="lucene", sort="new", limit=500):
+                        # Read each post's attributes once, skipping repeats across pages
+                        if post.id in matching_posts:
+                            continue
+                        title = post.title
+                        # Reddit's search tokenizes and stems, so keep only titles
+                        # that actually contain one of the keywords
+                        if keyword_re.search(title):
+                            matching_posts[post.id] = (title, post.url, str(post.subreddit))
+                except Exception as e:
+                    st.write(f"Error searching subreddits '{multi}': {e}")
                 
-                # Process each subreddit
-                for subreddit_name in subreddits:
-                    try:
-                        # Limit to 50 new posts per subreddit (adjust as needed)
-                        all_posts = reddit.subreddit(subreddit_name).new(limit=50)
-                        for post in all_posts:
-                            title_lower = post.title.lower()
-                            if any(k.lower() in title_lower for k in keywords):
-                                # Expand all comments (removing MoreComments objects)
-                                post.comments.replace_more(limit=0)
-                                for comment in post.comments.list():
-                                    all_data.append({
-                                        "text": comment.body,
-                                        "title": post.title,
-                                        "url": post.url,
-                                        "subreddit": subreddit_name,
-                                        "date": datetime.fromtimestamp(comment.created_utc)
-                                    })
-                    except Exception as e:
-                        st.write(f"Error processing subreddit '{subreddit_name}': {e}")
-
-                if not all_data:
+                # Stream comments into DataFrame chunks until the cap is reached
+                progress = st.progress(0.0)
+                chunks = []
+                columns = ([], [], [], [], [])
+                n_comments = 0
+                with closing(scrape(credentials, matching_posts)) as comments:
+                    for row in comments:
+                        for column, value in zip(columns, row):
+                            column.append(value)
+                        n_comments += 1
+                        if n_comments % 100 == 0:
+                            progress.progress(n_comments / MAX_COMMENTS)
+                        if len(columns[0]) == CHUNK_ROWS:
+                            chunks.append(comments_frame(*columns))
+                            columns = ([], [], [], [], [])
+                        if n_comments == MAX_COMMENTS:
+                            st.write(f"Stopped after the first {MAX_COMMENTS} comments.")
+                            break
+                if columns[0]:
+                    chunks.append(comments_frame(*columns))
+                progress.empty()
+
+                if not chunks:
                     st.info("No comments were found matching the specified keywords.")
                 else:
-                    # Create DataFrame and reorder columns
-                    df = pd.DataFrame(all_data)
-                    df = df[["text", "title", "url", "subreddit", "date"]]
+                    df = pd.concat(chunks, ignore_index=True)
+                    # Store the strings in contiguous Arrow buffers instead of Python objects
+                    df = df.astype({
+                        'text': 'string[pyarrow]',
+                        'title': 'string[pyarrow]',
+                        'url': 'string[pyarrow]',
+                        'subreddit': 'category'
+                    })
                     
                     # Create an output folder with a timestamp
                     now = datetime.now()
@@ -87,42 +207,54 @@ if st.button("Run Analysis"):
                     folder_name = f"Data_{dt_string}"
                     os.makedirs(folder_name, exist_ok=True)
                     
-                    # Save CSV and TAB files
-                    csv_path = os.path.join(folder_name, f"{folder_name}.csv")
-                    tab_path = os.path.join(folder_name, f"{folder_name}.tab")
-                    df.to_csv(csv_path, index=False)
-                    df.to_csv(tab_path, sep="\t", index=False)
-                    
                     # --- Sentiment Analysis ---
                     st.info("Performing sentiment analysis...")
-                    sid = SentimentIntensityAnalyzer()
-                    df['scores'] = df['text'].apply(lambda x: sid.polarity_scores(str(x)))
-                    df['compound'] = df['scores'].apply(lambda x: x['compound'])
-                    df['neg'] = df['scores'].apply(lambda x: x['neg'])
-                    df['neu'] = df['scores'].apply(lambda x: x['neu'])
-                    df['pos'] = df['scores'].apply(lambda x: x['pos'])
-                    
-                    # Function to classify sentiment based on compound score
-                    def classify_sentiment(score):
-                        if score >= 0.05:
-                            return 'positive'
-                        elif score <= -0.05:
-                            return 'negative'
+                    # Empty, deleted/removed and URL-only comments get the scores VADER
+                    # would give them; only the rest are sent to VADER
+                    non_blank = non_blank_mask(df['text'])
+                    df[SCORE_COLUMNS] = unscored_defaults(non_blank)
+                    mask = scorable_mask(df['text'], non_blank)
+                    if mask.any():
+                        texts_to_score = prepare_texts(df.loc[mask, 'text']).to_numpy()
+                        # Score with the cached analyzer instead of re-parsing the lexicon
+                        sid = get_sid()
+                        if len(texts_to_score) < PARALLEL_MIN_ROWS or not CAN_FORK:
+                            # Small scrapes score faster in-process than a pool starts up
+                            init_worker(sid)
+                            scores = score_chunk(texts_to_score)
                         else:
-                            return 'neutral'
+                            # Split the comments into chunks and score them across all cores.
+                            # The fetch threads have been joined by now, though the
+                            # workers still inherit copies of the server's own threads' state.
+                            n_chunks = (os.cpu_count() or 1) * 4
+                            text_chunks = np.array_split(texts_to_score, n_chunks)
+                            with ProcessPoolExecutor(
+                                mp_context=multiprocessing.get_context("fork"),
+                                initializer=init_worker,
+                                initargs=(sid,)
+                            ) as executor:
+                                scores = np.concatenate(list(executor.map(score_chunk, text_chunks)))
+                        df.loc[mask, SCORE_COLUMNS] = scores
                     
-                    df['sentiment'] = df['compound'].apply(classify_sentiment)
+                    # Classify sentiment based on compound score
+                    # (codes: 0 = negative, 1 = neutral, 2 = positive)
+                    c = df['compound'].to_numpy()
+                    codes = np.where(c >= np.float32(0.05), 2, np.where(c <= np.float32(-0.05), 0, 1))
+                    df['sentiment'] = pd.Categorical.from_codes(codes, categories=['negative', 'neutral', 'positive'])
                     
-                    # Save sentiment analysis results
-                    sentiment_csv = os.path.join(folder_name, "sentiment_analysis_results.csv")
-                    df.to_csv(sentiment_csv, index=False)
+                    # Save the comments and their sentiment as CSV and TAB files
+                    csv_path = os.path.join(folder_name, f"{folder_name}.csv")
+                    tab_path = os.path.join(folder_name, f"{folder_name}.tab")
+                    df.to_csv(csv_path, index=False, chunksize=10000, lineterminator="\n")
+                    df.to_csv(tab_path, sep="\t", index=False, chunksize=10000, lineterminator="\n")
                     
                     # --- Display Summary ---
-                    sentiment_counts = df['sentiment'].value_counts()
+                    neg_count, neu_count, pos_count = np.bincount(codes, minlength=3)
+                    sentiment_counts = pd.Series(
+                        [pos_count, neu_count, neg_count],
+                        index=['positive', 'neutral', 'negative']
+                    )
                     total_posts = len(df)
-                    pos_count = sentiment_counts.get('positive', 0)
-                    neg_count = sentiment_counts.get('negative', 0)
-                    neu_count = sentiment_counts.get('neutral', 0)
                     
                     st.success("Sentiment Analysis Complete!")
                     st.write(f"**Total Comments Analyzed:** {total_posts}")
@@ -133,52 +265,49 @@ if st.button("Run Analysis"):
                     
                     # --- Plotting ---
                     # Time-series plot of sentiment over time
-                    df['date'] = pd.to_datetime(df['date'])
-                    df.set_index('date', inplace=True)
-                    sentiment_over_time = df.resample('D')['sentiment'].value_counts().unstack().fillna(0)
+                    sentiment_over_time = (
+                        pd.crosstab(df['date'].dt.floor('D'), df['sentiment'])
+                        .reindex(columns=['positive', 'neutral', 'negative'], fill_value=0)
+                        # Keep days without comments as zero rows, like resample did
+                        .asfreq('D', fill_value=0)
+                    )
                     
+                    # Display both charts natively, without rasterizing a figure
+                    st.line_chart(sentiment_over_time)
+                    st.bar_chart(sentiment_counts)
+                    
+                    # Render the PNGs for the ZIP into memory
                     fig1, ax1 = plt.subplots(figsize=(10, 5))
                     for s in ['positive', 'neutral', 'negative']:
-                        if s in sentiment_over_time.columns:
-                            ax1.plot(sentiment_over_time.index, sentiment_over_time[s], label=s)
+                        ax1.plot(sentiment_over_time.index, sentiment_over_time[s], label=s)
                     ax1.set_title("Sentiment Over Time")
                     ax1.set_xlabel("Date")
                     ax1.set_ylabel("Number of Comments")
                     ax1.legend()
-                    plt.tight_layout()
-                    
-                    # Save and display the time-series plot
-                    time_plot_path = os.path.join(folder_name, "sentiment_over_time.png")
-                    plt.savefig(time_plot_path)
-                    st.pyplot(fig1)
+                    fig1.tight_layout()
+                    time_plot_png = io.BytesIO()
+                    fig1.savefig(time_plot_png, format="png", dpi=80)
                     plt.close(fig1)
                     
-                    # Bar chart for overall sentiment distribution
                     fig2, ax2 = plt.subplots(figsize=(6, 4))
                     sentiment_counts.plot(kind='bar', color=['green', 'gray', 'red'], ax=ax2)
                     ax2.set_title("Overall Sentiment Distribution")
                     ax2.set_xlabel("Sentiment")
                     ax2.set_ylabel("Count")
-                    plt.tight_layout()
-                    
-                    # Save and display the bar chart
-                    dist_plot_path = os.path.join(folder_name, "sentiment_distribution.png")
-                    plt.savefig(dist_plot_path)
-                    st.pyplot(fig2)
+                    fig2.tight_layout()
+                    dist_plot_png = io.BytesIO()
+                    fig2.savefig(dist_plot_png, format="png", dpi=80)
                     plt.close(fig2)
                     
                     # --- Create In-Memory ZIP File for Download ---
                     zip_buffer = io.BytesIO()
-                    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-                        output_files = [
-                            csv_path,
-                            tab_path,
-                            sentiment_csv,
-                            time_plot_path,
-                            dist_plot_path
-                        ]
-                        for file_path in output_files:
+                    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
+                        # Fast deflate for the text files, streamed from disk
+                        for file_path in [csv_path, tab_path]:
                             zip_file.write(file_path, arcname=os.path.basename(file_path))
+                        # PNGs are already compressed, so store them as-is
+                        zip_file.writestr("sentiment_over_time.png", time_plot_png.getvalue(), compress_type=zipfile.ZIP_STORED)
+                        zip_file.writestr("sentiment_distribution.png", dist_plot_png.getvalue(), compress_type=zipfile.ZIP_STORED)
                     
                     zip_buffer.seek(0)
                     
@@ -190,4 +319,4 @@ if st.button("Run Analysis"):
                     )
                     
                     if st.checkbox("Show Raw Data"):
-                        st.dataframe(df.reset_index())
+                        st.dataframe(df)
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+import numpy as np
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+# Order of the columns returned by score_chunk
+SCORE_COLUMNS = ["compound", "neg", "neu", "pos"]
+
+# VADER slows down quadratically on long runs of emoticons/emoji, so long
+# comments are truncated and runs of a repeated symbol capped at four before
+# scoring. Four keeps VADER's emphasis caps intact: it counts up to 4 "!" and
+# gives any run of more than 3 "?" the same boost.
+MAX_TEXT_LENGTH = 2000
+REPEATED_SYMBOLS = re.compile(r'([^\w\s])\1{4,}')
+
+# Placeholder and bare-link comments carry no sentiment, so they are never scored
+UNSCORABLE_TEXT = r'\[deleted\]|\[removed\]|https?://\S+'
+
+
+def non_blank_mask(texts):
+    """Return a boolean mask of the comments with any non-whitespace text."""
+    return texts.str.strip().str.len().gt(0)
+
+
+def scorable_mask(texts, non_blank):
+    """Return a boolean mask of the comments worth scoring, given non_blank_mask(texts)."""
+    return non_blank & ~texts.str.fullmatch(UNSCORABLE_TEXT)
+
+
+def unscored_defaults(non_blank):
+    """Return the (n, 4) float32 scores VADER gives comments skipped by scorable_mask.
+
+    Blank text scores all zeros; any other text without sentiment scores neu=1.0.
+    """
+    scores = np.zeros((len(non_blank), len(SCORE_COLUMNS)), dtype=np.float32)
+    scores[non_blank.to_numpy(dtype=bool), SCORE_COLUMNS.index("neu")] = 1.0
+    return scores
+
+
+def prepare_texts(texts):
+    """Truncate a Series of comments and cap runs of a repeated symbol at four."""
+    return (
+        texts.astype(str)
+        .str.slice(0, MAX_TEXT_LENGTH)
+        .str.replace(REPEATED_SYMBOLS, r'\1\1\1\1', regex=True)
+    )
+
+
+# Directory holding the parsed VADER lexicons, one pickle per lexicon text
+LEXICON_CACHE_DIR = tempfile.gettempdir()
+
+
+class PickledLexiconAnalyzer(SentimentIntensityAnalyzer):
+    """SentimentIntensityAnalyzer that unpickles its parsed lexicon instead of re-parsing it.
+
+    NLTK still loads the lexicon text; only the parse is skipped, which saves a
+    few milliseconds. The analyzer is built once per server process and shipped
+    to scoring workers, so this is a small, once-per-process saving. Pickles
+    are keyed on a hash of the lexicon text, so custom or updated lexicons get
+    their own.
+    """
+
+    def make_lex_dict(self):
+        text = self.lexicon_file
+        digest = hashlib.sha1(text.encode("utf-8") if isinstance(text, str) else text).hexdigest()
+        pickle_path = os.path.join(LEXICON_CACHE_DIR, f"vader_lexicon.{digest[:12]}.pkl")
+        try:
+            with open(pickle_path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            # Missing, corrupt or written by another Python/NLTK version
+            lexicon = super().make_lex_dict()
+        # Write to a temporary file first so readers never see a partial pickle
+        tmp_path = f"{pickle_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(lexicon, f, protocol=5)
+            os.replace(tmp_path, pickle_path)
+        except Exception:
+            # The cache is best-effort: drop the partial file and keep the parsed lexicon
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        return lexicon
+
+
+# Analyzer shared by every chunk scored in this process
+_sid = None
+
+
+def init_worker(sid):
+    """ProcessPoolExecutor initializer installing an already-built analyzer."""
+    global _sid
+    _sid = sid
+
+
+def score_chunk(texts):
+    """Score a chunk of comments with VADER, returning an (n, 4) float32 array.
+
+    Lives in its own module so ProcessPoolExecutor workers can import it.
+    """
+    global _sid
+    if _sid is None:
+        _sid = PickledLexiconAnalyzer()
+    sid = _sid
+    rows = [
+        (s['compound'], s['neg'], s['neu'], s['pos'])
+        for t in texts
+        for s in (sid.polarity_scores(str(t)),)
+    ]
+    # Scores lie in [-1, 1] with 4 decimals, so float32 is plenty; reshape
+    # keeps empty chunks as (0, 4) so np.concatenate still works
+    return np.array(rows, dtype=np.float32).reshape(-1, len(SCORE_COLUMNS))